@@ -1,66 +1,143 @@
 from __future__ import annotations
-from collections.abc import Iterable, Sequence
-from typing import Union
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any, Optional, Union
 
-from .expr import Expr, BinExpr
+from .expr import Expr, BinExpr, evalExpr, exprIntern, internKeyPart
+from .expr import CE_AGG, compileExprHelper, pySourceHelper
 
 
 class AggExpr(Expr):
+    __slots__ = ('op', 'args', '_key', '_str')
+
     def __init__(self, op: str, args: Sequence[object]):
         super().__init__()
         self.op = op
         self.args = args
+        self._key: Optional[object] = None
+        self._str: Optional[str] = None
+
+    @classmethod
+    def make(cls, op: str, args: Sequence[object]) -> AggExpr:
+        # hash-consing factory: structurally equal aggregates share one node
+        if not Expr.hashCons:
+            return cls(op, args)
+        key = (cls, op, tuple([internKeyPart(x) for x in args]))
+        try:
+            expr = exprIntern.get(key)
+        except TypeError:  # unhashable arg
+            return cls(op, args)
+        if isinstance(expr, cls):
+            return expr
+        newExpr = cls(op, args)
+        exprIntern[key] = newExpr
+        return newExpr
 
     def __repr__(self) -> str:
-        return '{}({}, {})'.format(self.__class__.__name__, repr(self.op), repr(self.args))
+        return f'{self.__class__.__name__}({self.op!r}, {self.args!r})'
 
     def __str__(self) -> str:
-        sep = ' ' + self.op + ' '
-        return '(' + sep.join([str(x) for x in self.args]) + ')'
+        s = self._str
+        if s is None:
+            sep = ' ' + self.op + ' '
+            s = '(' + sep.join([str(x) for x in self.args]) + ')'
+            self._str = s
+        return s
+
+    def eval(self, varMap: Mapping[object, object]) -> object:
+        # short-circuits like the corresponding python operator, returning
+        # the last evaluated operand
+        if self.op == 'and':
+            result: object = True
+            for x in self.args:
+                result = evalExpr(x, varMap)
+                if not result:
+                    break
+            return result
+        elif self.op == 'or':
+            result = False
+            for x in self.args:
+                result = evalExpr(x, varMap)
+                if result:
+                    break
+            return result
+        else:
+            raise ValueError(f'cannot evaluate AggExpr with op {self.op!r}')
+
+    def compileInto(self, code: list[tuple[int, Any]]) -> None:
+        if self.op not in ('and', 'or'):
+            raise ValueError(f'cannot compile AggExpr with op {self.op!r}')
+        for x in self.args:
+            compileExprHelper(x, code)
+        code.append((CE_AGG, (self.op, len(self.args))))
+
+    def pySource(self, varIndex: Mapping[object, int], consts: list[object]) -> str:
+        if self.op not in ('and', 'or'):
+            raise ValueError(f'cannot compile AggExpr with op {self.op!r}')
+        sep = f' {self.op} '
+        return '(' + sep.join([pySourceHelper(x, varIndex, consts) for x in self.args]) + ')'
 
     def key(self) -> object:
-        argKeys = tuple([x.key() if isinstance(x, Expr) else x for x in self.args])
-        return (self.__class__.__name__, self.op, argKeys)
+        k = self._key
+        if k is None:
+            argKeys = tuple([x.key() if isinstance(x, Expr) else x for x in self.args])
+            k = (self.__class__.__name__, self.op, argKeys)
+            self._key = k
+        return k
 
 
 def flattenExprHelper(expr: object, op: str, output: list[object]) -> None:
-    if isinstance(expr, BinExpr):
-        if expr.op == op:
-            flattenExprHelper(expr.larg, op, output)
-            flattenExprHelper(expr.rarg, op, output)
-        else:
-            output.append(expr)
-    elif isinstance(expr, AggExpr):
-        if expr.op == op:
-            for arg in expr.args:
-                flattenExprHelper(arg, op, output)
+    # explicit stack instead of recursion: deep sums/products would otherwise
+    # pay a Python frame per node and risk the recursion limit
+    stack = [expr]
+    while stack:
+        x = stack.pop()
+        if isinstance(x, BinExpr):
+            if x.op == op:
+                stack.append(x.rarg)
+                stack.append(x.larg)
+            else:
+                output.append(x)
+        elif isinstance(x, AggExpr):
+            if x.op == op:
+                stack.extend(reversed(x.args))
+            else:
+                output.append(x)
         else:
-            output.append(expr)
-    else:
-        output.append(expr)
+            output.append(x)
 
 
 def flattenExpr(expr: object, op: str) -> AggExpr:
     terms: list[object] = []
     flattenExprHelper(expr, op, terms)
-    return AggExpr(op, terms)
+    return AggExpr.make(op, terms)
 
 
-def all(it: Iterable[object]) -> Union[bool, AggExpr]:
+def all(it: Iterable[object]) -> Union[bool, Expr]:
     terms: list[Expr] = []
     for x in it:
         if isinstance(x, Expr):
             terms.append(x)
         elif not x:
             return False
-    return AggExpr('and', terms)
+    # an empty or single-term conjunction needs no AggExpr (and no fork)
+    if not terms:
+        return True
+    elif len(terms) == 1:
+        return terms[0]
+    else:
+        return AggExpr.make('and', tuple(terms))
 
 
-def any(it: Iterable[object]) -> Union[bool, AggExpr]:
+def any(it: Iterable[object]) -> Union[bool, Expr]:
     terms: list[Expr] = []
     for x in it:
         if isinstance(x, Expr):
             terms.append(x)
         elif x:
             return True
-    return AggExpr('or', terms)
+    if not terms:
+        return False
+    elif len(terms) == 1:
+        return terms[0]
+    else:
+        return AggExpr.make('or', tuple(terms))
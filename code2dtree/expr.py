@@ -1,20 +1,71 @@
 from __future__ import annotations
-from collections.abc import Iterable, Mapping
-from typing import Callable, Optional, TYPE_CHECKING
+import math
+import operator
+import weakref
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any, Callable, Optional, TYPE_CHECKING, cast
 
 if TYPE_CHECKING:
     from .rrtg import RepeatedRunTreeGen
 
 
+exprIntern: weakref.WeakValueDictionary[object, Expr] = weakref.WeakValueDictionary()
+
+
+def internKeyPart(x: object) -> object:
+    # identical Expr operands are detected by identity, plain values by (type, value)
+    if isinstance(x, Expr):
+        return id(x)
+    else:
+        return (type(x), x)
+
+
+def isZero(x: object) -> bool:
+    # fast path for the common operand types: an exact-type check is a
+    # pointer compare, and int/float zeros dominate in symbolic arithmetic
+    c = x.__class__
+    if c is int or c is float:
+        return x == 0
+    return not isinstance(x, Expr) and x == 0
+
+
 class Expr:
+    __slots__ = ('__weakref__', '_hash')
+
     globalTreeGen: Optional[RepeatedRunTreeGen] = None
     simplifyAdd = True
+    # set to False to disable hash-consing in the make factories,
+    # e.g. if expression nodes are mutated after construction
+    hashCons = True
+
+    def __init__(self) -> None:
+        self._hash: Optional[int] = None
 
     def key(self) -> object:
         raise NotImplementedError()
 
+    def eval(self, varMap: Mapping[object, object]) -> object:
+        raise NotImplementedError()
+
+    def compileInto(self, code: list[tuple[int, Any]]) -> None:
+        raise NotImplementedError()
+
+    def pySource(self, varIndex: Mapping[object, int], consts: list[object]) -> str:
+        raise NotImplementedError()
+
     def __hash__(self) -> int:
-        return 0
+        # structural and cached: exprs with equal keys hash equal, so dicts
+        # and sets keyed by Expr no longer collapse into a single bucket
+        h = self._hash
+        if h is None:
+            h = hash(self.key())
+            self._hash = h
+        return h
+
+    def structuralEq(self, other: object) -> bool:
+        # __eq__ is overloaded to build a BinExpr, so structural comparison
+        # needs its own method; keys are made of primitives, safe to compare
+        return self is other or (isinstance(other, Expr) and self.key() == other.key())
 
     def __bool__(self) -> bool:
         if Expr.globalTreeGen is not None:
@@ -23,103 +74,160 @@ class Expr:
             raise NotImplementedError("forking on expressions is disabled.")
 
     def __add__(self, other: object) -> Expr:
-        if Expr.simplifyAdd and not isinstance(other, Expr) and other == 0:
+        if Expr.simplifyAdd and isZero(other):
             return self
         else:
-            return BinExpr('+', self, other)
+            return BinExpr.make('+', self, other)
 
     def __radd__(self, other: object) -> Expr:
-        if Expr.simplifyAdd and not isinstance(other, Expr) and other == 0:
+        if Expr.simplifyAdd and isZero(other):
             return self
         else:
-            return BinExpr('+', other, self)
+            return BinExpr.make('+', other, self)
 
     def __sub__(self, other: object) -> Expr:
-        if Expr.simplifyAdd and not isinstance(other, Expr) and other == 0:
+        if Expr.simplifyAdd and isZero(other):
             return self
         else:
-            return BinExpr('-', self, other)
+            return BinExpr.make('-', self, other)
 
     def __rsub__(self, other: object) -> Expr:
-        if Expr.simplifyAdd and not isinstance(other, Expr) and other == 0:
-            return UnExpr('-', self, False)
+        if Expr.simplifyAdd and isZero(other):
+            return UnExpr.make('-', self, False)
         else:
-            return BinExpr('-', other, self)
+            return BinExpr.make('-', other, self)
 
     def __pos__(self) -> Expr:
-        return self if Expr.simplifyAdd else UnExpr('+', self, False)
+        return self if Expr.simplifyAdd else UnExpr.make('+', self, False)
 
     def __neg__(self) -> Expr:
         if Expr.simplifyAdd and isinstance(self, UnExpr) and self.op == '-':
             return self.arg
         else:
-            return UnExpr('-', self, False)
+            return UnExpr.make('-', self, False)
 
 
 class Var(Expr):
+    __slots__ = ('name', '_key')
+
     registry: dict[object, Var] = {}
 
     @staticmethod
     def get(name: object) -> Var:
-        try:
-            return Var.registry[name]
-        except KeyError:
-            return Var(name)
+        # registry never stores None, so dict.get doubles as the sentinel;
+        # a miss costs no exception
+        v = Var.registry.get(name)
+        return v if v is not None else Var(name)
 
     def __init__(self, name: object):
         super().__init__()
-        if name in Var.registry:
+        if Var.registry.get(name) is not None:
             raise Exception('{}({}) already exists'.format(self.__class__.__name__, repr(name)))
         else:
             self.name = name
+            self._key = (self.__class__.__name__, name)
             Var.registry[name] = self
 
     def __repr__(self) -> str:
-        return '{}({})'.format(self.__class__.__name__, repr(self.name))
+        return f'{self.__class__.__name__}({self.name!r})'
 
     def __str__(self) -> str:
         return str(self.name)
 
     def key(self) -> object:
-        return (self.__class__.__name__, self.name)
+        return self._key
 
+    def eval(self, varMap: Mapping[object, object]) -> object:
+        return varMap[self.name]
+
+    def compileInto(self, code: list[tuple[int, Any]]) -> None:
+        code.append((CE_VAR, self.name))
+
+    def pySource(self, varIndex: Mapping[object, int], consts: list[object]) -> str:
+        return f'v[{varIndex[self.name]}]'
 
-varListStyles = {
-    'python': '{name}[{i}]',
-    'uscore': '{name}_{i}',
-    'simple': '{name}{i}',
-    'small': '{name}{iS}',
-}
 
 SUB_TR_TABLE = str.maketrans('0123456789', '₀₁₂₃₄₅₆₇₈₉')
 
+# style name to naming function: one dict lookup per getVarList call,
+# then f-string bytecode per variable instead of re-parsing a template
+varListStyles: dict[str, Callable[[str, int], str]] = {
+    'python': lambda name, i: f'{name}[{i}]',
+    'uscore': lambda name, i: f'{name}_{i}',
+    'simple': lambda name, i: f'{name}{i}',
+    'small': lambda name, i, _tr=SUB_TR_TABLE: f'{name}{str(i).translate(_tr)}',  # type: ignore[misc]
+}
+
 
 def getVarList(listName: str, n: int, style: str = 'python') -> list[Var]:
-    if style != 'small':
-        return [Var.get(varListStyles[style].format(name=listName, i=i)) for i in range(n)]
-    else:
-        return [Var.get(varListStyles[style].format(name=listName,
-            iS=str(i).translate(SUB_TR_TABLE))) for i in range(n)]
+    f = varListStyles[style]
+    get = Var.get
+    return [get(f(listName, i)) for i in range(n)]
 
 
 class BinExpr(Expr):
+    __slots__ = ('op', 'larg', 'rarg', '_key', '_str')
+
     def __init__(self, op: str, larg: object, rarg: object):
         super().__init__()
         self.op = op
         self.larg = larg
         self.rarg = rarg
+        self._key: Optional[object] = None
+        self._str: Optional[str] = None
+
+    @classmethod
+    def make(cls, op: str, larg: object, rarg: object) -> BinExpr:
+        # hash-consing factory: structurally equal applications share one node
+        if not Expr.hashCons:
+            return cls(op, larg, rarg)
+        key = (cls, op, internKeyPart(larg), internKeyPart(rarg))
+        try:
+            expr = exprIntern.get(key)
+        except TypeError:  # unhashable operand
+            return cls(op, larg, rarg)
+        if isinstance(expr, cls):
+            return expr
+        newExpr = cls(op, larg, rarg)
+        exprIntern[key] = newExpr
+        return newExpr
 
     def __repr__(self) -> str:
-        return '{}({}, {}, {})'.format(self.__class__.__name__, repr(self.op),
-            repr(self.larg), repr(self.rarg))
+        return f'{self.__class__.__name__}({self.op!r}, {self.larg!r}, {self.rarg!r})'
 
     def __str__(self) -> str:
-        return '({} {} {})'.format(str(self.larg), str(self.op), str(self.rarg))
+        s = self._str
+        if s is None:
+            s = f'({self.larg} {self.op} {self.rarg})'
+            self._str = s
+        return s
 
     def key(self) -> object:
-        lkey = self.larg.key() if isinstance(self.larg, Expr) else self.larg
-        rkey = self.rarg.key() if isinstance(self.rarg, Expr) else self.rarg
-        return (self.__class__.__name__, self.op, lkey, rkey)
+        k = self._key
+        if k is None:
+            lkey = self.larg.key() if isinstance(self.larg, Expr) else self.larg
+            rkey = self.rarg.key() if isinstance(self.rarg, Expr) else self.rarg
+            k = (self.__class__.__name__, self.op, lkey, rkey)
+            self._key = k
+        return k
+
+    def eval(self, varMap: Mapping[object, object]) -> object:
+        return BIN_OP_FUNCS[self.op](evalExpr(self.larg, varMap), evalExpr(self.rarg, varMap))
+
+    def compileInto(self, code: list[tuple[int, Any]]) -> None:
+        larg, rarg = self.larg, self.rarg
+        if not (isinstance(larg, Expr) or isinstance(rarg, Expr)):
+            # constant folding: both operands are literals
+            code.append((CE_CONST, BIN_OP_FUNCS[self.op](larg, rarg)))
+        else:
+            compileExprHelper(larg, code)
+            compileExprHelper(rarg, code)
+            code.append((CE_BIN, BIN_OP_FUNCS[self.op]))
+
+    def pySource(self, varIndex: Mapping[object, int], consts: list[object]) -> str:
+        lsrc = pySourceHelper(self.larg, varIndex, consts)
+        rsrc = pySourceHelper(self.rarg, varIndex, consts)
+        return f'({lsrc} {PY_OP.get(self.op, self.op)} {rsrc})'
 
 
 BIN_OPS = {
@@ -147,34 +255,76 @@ BinExprFunc = Callable[[Expr, object], BinExpr]
 
 
 def getBinMethods(op: str) -> tuple[BinExprFunc, BinExprFunc]:
-    def binMethod(self: Expr, other: object) -> BinExpr:
-        return BinExpr(op, self, other)
-
-    def rbinMethod(self: Expr, other: object) -> BinExpr:
-        return BinExpr(op, other, self)
-
-    return (binMethod, rbinMethod)
+    # generated from source so the op is a bytecode constant; the factory
+    # stays a default arg, so the body has no closure-cell or global loads
+    ns: dict[str, object] = {'BinExpr': BinExpr}
+    src = (
+        f'def binMethod(self, other, _make=BinExpr.make):\n'
+        f'    return _make({op!r}, self, other)\n'
+        f'def rbinMethod(self, other, _make=BinExpr.make):\n'
+        f'    return _make({op!r}, other, self)\n'
+    )
+    exec(src, ns)
+    return (cast(BinExprFunc, ns['binMethod']), cast(BinExprFunc, ns['rbinMethod']))
 
 
 class UnExpr(Expr):
+    __slots__ = ('op', 'arg', 'isFunc', '_key', '_str')
+
     def __init__(self, op: str, arg: Expr, isFunc: bool = True):
         super().__init__()
         self.op = op
         self.arg = arg
         self.isFunc = isFunc
+        self._key: Optional[object] = None
+        self._str: Optional[str] = None
+
+    @classmethod
+    def make(cls, op: str, arg: Expr, isFunc: bool = True) -> UnExpr:
+        if not Expr.hashCons:
+            return cls(op, arg, isFunc)
+        key = (cls, op, internKeyPart(arg), isFunc)
+        expr = exprIntern.get(key)
+        if isinstance(expr, cls):
+            return expr
+        newExpr = cls(op, arg, isFunc)
+        exprIntern[key] = newExpr
+        return newExpr
 
     def __repr__(self) -> str:
-        return '{}({}, {})'.format(self.__class__.__name__, repr(self.op), repr(self.arg))
+        return f'{self.__class__.__name__}({self.op!r}, {self.arg!r})'
 
     def __str__(self) -> str:
-        if self.isFunc:
-            return '{}({})'.format(str(self.op), str(self.arg))
-        else:
-            return '({} {})'.format(str(self.op), str(self.arg))
+        s = self._str
+        if s is None:
+            if self.isFunc:
+                s = f'{self.op}({self.arg})'
+            else:
+                s = f'({self.op} {self.arg})'
+            self._str = s
+        return s
 
     def key(self) -> object:
-        argKey = self.arg.key() if isinstance(self.arg, Expr) else self.arg
-        return (self.__class__.__name__, self.op, argKey)
+        k = self._key
+        if k is None:
+            argKey = self.arg.key() if isinstance(self.arg, Expr) else self.arg
+            k = (self.__class__.__name__, self.op, argKey)
+            self._key = k
+        return k
+
+    def eval(self, varMap: Mapping[object, object]) -> object:
+        return UN_OP_FUNCS[self.op](evalExpr(self.arg, varMap))
+
+    def compileInto(self, code: list[tuple[int, Any]]) -> None:
+        self.arg.compileInto(code)
+        code.append((CE_UN, UN_OP_FUNCS[self.op]))
+
+    def pySource(self, varIndex: Mapping[object, int], consts: list[object]) -> str:
+        argSrc = self.arg.pySource(varIndex, consts)
+        if self.isFunc:
+            return f'{PY_FUNC[self.op]}({argSrc})'
+        else:
+            return f'({self.op} {argSrc})'
 
 
 UN_OPS = {
@@ -188,10 +338,159 @@ UnExprFunc = Callable[[Expr], UnExpr]
 
 
 def getUnMethod(op: str, isFunc: bool) -> UnExprFunc:
-    def unMethod(self: Expr) -> UnExpr:
-        return UnExpr(op, self, isFunc)
+    ns: dict[str, object] = {'UnExpr': UnExpr}
+    src = (
+        f'def unMethod(self, _make=UnExpr.make):\n'
+        f'    return _make({op!r}, self, {isFunc!r})\n'
+    )
+    exec(src, ns)
+    return cast(UnExprFunc, ns['unMethod'])
+
+
+BIN_OP_FUNCS: dict[str, Callable[[Any, Any], object]] = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '@': operator.matmul,
+    '/': operator.truediv,
+    '//': operator.floordiv,
+    '%': operator.mod,
+    '**': operator.pow,
+    '<<': operator.lshift,
+    '>>': operator.rshift,
+    '&': operator.and_,
+    '^': operator.xor,
+    '|': operator.or_,
+    '<': operator.lt,
+    '≤': operator.le,
+    '>': operator.gt,
+    '≥': operator.ge,
+    '==': operator.eq,
+    '≠': operator.ne,
+}
+
+UN_OP_FUNCS: dict[str, Callable[[Any], object]] = {
+    '~': operator.invert,
+    '+': operator.pos,
+    '-': operator.neg,
+    'abs': abs,
+    'round': round,
+    'floor': math.floor,
+    'ceil': math.ceil,
+}
 
-    return unMethod
+
+# opcodes for compiled expressions
+CE_CONST, CE_VAR, CE_BIN, CE_UN, CE_AGG = range(5)
+
+
+def compileExprHelper(x: object, code: list[tuple[int, Any]]) -> None:
+    if isinstance(x, Expr):
+        x.compileInto(code)
+    else:
+        code.append((CE_CONST, x))
+
+
+class CompiledExpr:
+    # linear postorder form of an expr: evaluating is one loop over
+    # instructions instead of recursive method dispatch per node
+    __slots__ = ('code',)
+
+    def __init__(self, code: list[tuple[int, Any]]):
+        self.code = code
+
+    def __call__(self, varMap: Mapping[object, object]) -> object:
+        stack: list[object] = []
+        push = stack.append
+        pop = stack.pop
+        for opc, arg in self.code:
+            if opc == CE_BIN:
+                r = pop()
+                push(arg(pop(), r))
+            elif opc == CE_VAR:
+                push(varMap[arg])
+            elif opc == CE_CONST:
+                push(arg)
+            elif opc == CE_UN:
+                push(arg(pop()))
+            else:  # CE_AGG; all args are evaluated, then folded like and/or
+                aggOp, n = arg
+                if n == 0:  # stack[-0:] would slice everything
+                    push(aggOp == 'and')
+                    continue
+                vals = stack[-n:]
+                del stack[-n:]
+                if aggOp == 'and':
+                    result: object = True
+                    for v in vals:
+                        result = v
+                        if not v:
+                            break
+                else:
+                    result = False
+                    for v in vals:
+                        result = v
+                        if v:
+                            break
+                push(result)
+        return pop()
+
+
+def compileExpr(x: object) -> CompiledExpr:
+    code: list[tuple[int, Any]] = []
+    compileExprHelper(x, code)
+    return CompiledExpr(code)
+
+
+# operators whose python spelling differs from their display symbol
+PY_OP = {
+    '≤': '<=',
+    '≥': '>=',
+    '≠': '!=',
+}
+
+PY_FUNC = {
+    'abs': 'abs',
+    'round': 'round',
+    'floor': 'math.floor',
+    'ceil': 'math.ceil',
+}
+
+
+def pySourceHelper(x: object, varIndex: Mapping[object, int], consts: list[object]) -> str:
+    if isinstance(x, Expr):
+        return x.pySource(varIndex, consts)
+    else:
+        # constants go through a tuple in the namespace, so they need not
+        # have round-trippable reprs
+        i = len(consts)
+        consts.append(x)
+        return f'_c[{i}]'
+
+
+def codegenExpr(x: object, varOrder: Sequence[object]) -> Callable[[Sequence[Any]], object]:
+    # generate and compile a python function evaluating x, with variables
+    # passed positionally in varOrder; CPython runs the resulting bytecode
+    # directly, with no per-node dispatch at all
+    varIndex = {name: i for i, name in enumerate(varOrder)}
+    consts: list[object] = []
+    body = pySourceHelper(x, varIndex, consts)
+    ns: dict[str, object] = {'math': math, '_c': tuple(consts)}
+    exec(f'def compiledExpr(v):\n    return {body}\n', ns)
+    return cast(Callable[[Sequence[Any]], object], ns['compiledExpr'])
+
+
+def evalExpr(x: object, varMap: Mapping[object, object]) -> object:
+    # evaluate x for a concrete assignment of variables; containers are
+    # evaluated elementwise, non-Expr leaves are returned as-is
+    if isinstance(x, Expr):
+        return x.eval(varMap)
+    elif isinstance(x, tuple):
+        return tuple([evalExpr(y, varMap) for y in x])
+    elif isinstance(x, list):
+        return [evalExpr(y, varMap) for y in x]
+    else:
+        return x
 
 
 def overloadOps() -> None:
@@ -210,26 +509,109 @@ def overloadOps() -> None:
 overloadOps()
 
 
+class PrettyToken:
+    # a literal piece of output on the prettyExprRepr work stack
+    __slots__ = ('s',)
+
+    def __init__(self, s: str):
+        self.s = s
+
+
+COMMA_TOK = PrettyToken(', ')
+COLON_TOK = PrettyToken(': ')
+
+
+def pushPrettySeq(x: Iterable[object], closeTok: PrettyToken, stack: list[object]) -> None:
+    # push elements so they pop in order, comma-separated, then closeTok
+    items = list(x)
+    stack.append(closeTok)
+    for i in range(len(items) - 1, 0, -1):
+        stack.append(items[i])
+        stack.append(COMMA_TOK)
+    if items:
+        stack.append(items[0])
+
+
+def pushPrettyMapping(x: Mapping[object, object], closeTok: PrettyToken, stack: list[object]) -> None:
+    items = list(x.items())
+    stack.append(closeTok)
+    for i in range(len(items) - 1, -1, -1):
+        k, v = items[i]
+        stack.append(v)
+        stack.append(COLON_TOK)
+        stack.append(k)
+        if i:
+            stack.append(COMMA_TOK)
+
+
 def prettyExprRepr(x: object) -> str:
-    if isinstance(x, str):
-        return repr(x)
-    elif isinstance(x, tuple) and hasattr(x, '_fields'):  # x is a namedtuple
-        return repr(x)
-    elif isinstance(x, Expr):
-        s = str(x)
-        return s[1:-1] if s[0] == '(' else s
-    elif isinstance(x, Iterable):
-        csv = ', '.join([prettyExprRepr(y) for y in x])
-        if isinstance(x, tuple):
-            return '(' + csv + ')'
-        elif isinstance(x, set):
-            return '{' + csv + '}'
-        elif isinstance(x, list):
-            return '[' + csv + ']'
+    # iterative: a work stack of values and literal tokens, accumulated into
+    # one token list for a single join, so deep structures don't recurse
+    out: list[str] = []
+    stack: list[object] = [x]
+    dispatch = PRETTY_REPR_DISPATCH
+    while stack:
+        x = stack.pop()
+        t = type(x)
+        if t is PrettyToken:
+            out.append(x.s)  # type: ignore[attr-defined]
+            continue
+        handler = dispatch.get(t)
+        if handler is not None:
+            handler(x, stack, out)
+        elif isinstance(x, str):  # str subclass: render like str, not as an iterable
+            out.append(repr(x))
+        elif isinstance(x, tuple) and hasattr(x, '_fields'):  # x is a namedtuple
+            out.append(repr(x))
+        elif isinstance(x, Expr):
+            s = str(x)
+            out.append(s[1:-1] if s[0] == '(' else s)
+        elif isinstance(x, Iterable):
+            out.append(x.__class__.__name__ + '([')
+            pushPrettySeq(x, PrettyToken('])'), stack)
+        elif isinstance(x, Mapping):
+            out.append('{')
+            pushPrettyMapping(x, CLOSE_BRACE_TOK, stack)
         else:
-            return '{}([{}])'.format(x.__class__.__name__, csv)
-    elif isinstance(x, Mapping):
-        return '{' + ', '.join([prettyExprRepr(k) + ': ' + prettyExprRepr(v)
-            for k, v in x.items()]) + '}'
-    else:
-        return repr(x)
+            out.append(repr(x))
+    return ''.join(out)
+
+
+CLOSE_PAREN_TOK = PrettyToken(')')
+CLOSE_BRACKET_TOK = PrettyToken(']')
+CLOSE_BRACE_TOK = PrettyToken('}')
+
+
+def prettyStrHandler(x: str, stack: list[object], out: list[str]) -> None:
+    out.append(repr(x))
+
+
+def prettyTupleHandler(x: tuple[object, ...], stack: list[object], out: list[str]) -> None:
+    out.append('(')
+    pushPrettySeq(x, CLOSE_PAREN_TOK, stack)
+
+
+def prettyListHandler(x: list[object], stack: list[object], out: list[str]) -> None:
+    out.append('[')
+    pushPrettySeq(x, CLOSE_BRACKET_TOK, stack)
+
+
+def prettySetHandler(x: set[object], stack: list[object], out: list[str]) -> None:
+    out.append('{')
+    pushPrettySeq(x, CLOSE_BRACE_TOK, stack)
+
+
+def prettyDictHandler(x: dict[object, object], stack: list[object], out: list[str]) -> None:
+    out.append('{')
+    pushPrettyMapping(x, CLOSE_BRACE_TOK, stack)
+
+
+# fast path keyed on exact type: one dict lookup instead of an isinstance
+# cascade; subclasses (e.g. namedtuples) miss and take the slow path
+PRETTY_REPR_DISPATCH: dict[type[object], Callable[[Any, list[object], list[str]], None]] = {
+    str: prettyStrHandler,
+    tuple: prettyTupleHandler,
+    list: prettyListHandler,
+    set: prettySetHandler,
+    dict: prettyDictHandler,
+}
@@ -1,10 +1,21 @@
+import weakref
 from .rrtg import RepeatedRunTreeGen
-from typing import Mapping, Optional
+from typing import Any, Callable, Mapping, Optional, Sequence
+
+
+exprIntern: weakref.WeakValueDictionary[object, Expr]
+
+def internKeyPart(x: object) -> object: ...
 
 
 class Expr:
     globalTreeGen: Optional[RepeatedRunTreeGen]
+    hashCons: bool
     def key(self) -> object: ...
+    def eval(self, varMap: Mapping[object, object]) -> object: ...
+    def compileInto(self, code: list[tuple[int, Any]]) -> None: ...
+    def pySource(self, varIndex: Mapping[object, int], consts: list[object]) -> str: ...
+    def structuralEq(self, other: object) -> bool: ...
     def __hash__(self) -> int: ...
     def __bool__(self) -> bool: ...
 
@@ -59,6 +70,7 @@ class Var(Expr):
 
 
 SUB_TR_TABLE: Mapping[int, Optional[int]]
+varListStyles: Mapping[str, Callable[[str, int], str]]
 
 def getVarList(listName: str, n: int, style: str = ...) -> list[Var]: ...
 
@@ -68,6 +80,8 @@ class BinExpr(Expr):
     larg: object
     rarg: object
     def __init__(self, op: str, larg: object, rarg: object) -> None: ...
+    @classmethod
+    def make(cls, op: str, larg: object, rarg: object) -> BinExpr: ...
 
 
 class UnExpr(Expr):
@@ -75,6 +89,8 @@ class UnExpr(Expr):
     arg: object
     isFunc: bool
     def __init__(self, op: str, arg: object, isFunc: bool = ...) -> None: ...
+    @classmethod
+    def make(cls, op: str, arg: Expr, isFunc: bool = ...) -> UnExpr: ...
 
 
 BIN_OPS: Mapping[str, str]
@@ -83,3 +99,25 @@ UN_FUNCS: Mapping[str, str]
 
 
 def prettyExprRepr(x: object) -> str: ...
+
+def evalExpr(x: object, varMap: Mapping[object, object]) -> object: ...
+
+
+CE_CONST: int
+CE_VAR: int
+CE_BIN: int
+CE_UN: int
+CE_AGG: int
+
+def compileExprHelper(x: object, code: list[tuple[int, Any]]) -> None: ...
+
+class CompiledExpr:
+    code: list[tuple[int, Any]]
+    def __init__(self, code: list[tuple[int, Any]]) -> None: ...
+    def __call__(self, varMap: Mapping[object, object]) -> object: ...
+
+def compileExpr(x: object) -> CompiledExpr: ...
+
+def pySourceHelper(x: object, varIndex: Mapping[object, int], consts: list[object]) -> str: ...
+
+def codegenExpr(x: object, varOrder: Sequence[object]) -> Callable[[Sequence[Any]], object]: ...
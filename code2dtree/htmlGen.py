@@ -29,6 +29,8 @@ def getTag(name: str, attrMap: AttrT = None, selfClosing: bool = False) -> str:
 
 
 class TagCtxMgr:
+    __slots__ = ('writer', 'tagName', 'attrMap')
+
     def __init__(self, writer: HtmlWriter, tagName: str, attrMap: AttrT = None):
         self.writer = writer
         self.tagName = tagName
@@ -43,38 +45,69 @@ class TagCtxMgr:
 
 
 class HtmlWriter:
+    __slots__ = ('file', 'write', 'indentStr', 'indent', 'curIndent', 'lines',
+        'pendingTag', 'tagStack')
+
     def __init__(self, file: TextIO, indentStr: str, indentLevel: int = 0):
         self.file = file
+        # bound once: each emit is a single write call with the newline
+        # included, skipping print's separator/end handling
+        self.write = file.write
         self.indentStr = indentStr
         self.indent = indentLevel
+        # kept in sync with indent so writes don't rebuild indentStr * depth
+        self.curIndent = indentStr * indentLevel
         self.lines = 0
+        # for the pooled tag() context manager (see tag below)
+        self.pendingTag: Optional[tuple[str, AttrT]] = None
+        self.tagStack: list[str] = []
 
     def openTag(self, name: str, attrMap: AttrT = None) -> None:
-        parts = [self.indent * self.indentStr]
-        getTagHelper(name, parts, attrMap)
-        print(''.join(parts), file=self.file)
+        if attrMap is None:
+            self.write(f'{self.curIndent}<{name}>\n')
+        else:
+            parts = [self.curIndent]
+            getTagHelper(name, parts, attrMap)
+            parts.append('\n')
+            self.write(''.join(parts))
         self.indent += 1
+        self.curIndent += self.indentStr
         self.lines += 1
 
     def closeTag(self, name: str) -> None:
         self.indent -= 1
-        parts = [self.indent * self.indentStr, '</', name, '>']
-        print(''.join(parts), file=self.file)
+        self.curIndent = self.curIndent[:len(self.curIndent) - len(self.indentStr)]
+        self.write(f'{self.curIndent}</{name}>\n')
         self.lines += 1
 
-    def addTag(self, name: str, text: str, attrMap: AttrT = None) -> None:
-        parts = [self.indent * self.indentStr]
+    def addTag(self, name: str, text: str, attrMap: AttrT = None,
+            _tr: Mapping[int, str] = textEscapeTable) -> None:
+        parts = [self.curIndent]
         getTagHelper(name, parts, attrMap)
-        parts.append(text.translate(textEscapeTable))
-        parts.extend(['</', name, '>'])
-        print(''.join(parts), file=self.file)
+        parts.extend([text.translate(_tr), '</', name, '>\n'])
+        self.write(''.join(parts))
         self.lines += 1
 
     def addScTag(self, name: str, attrMap: AttrT = None) -> None:
-        parts = [self.indent * self.indentStr]
+        parts = [self.curIndent]
         getTagHelper(name, parts, attrMap, selfClosing=True)
-        print(''.join(parts), file=self.file)
+        parts.append('\n')
+        self.write(''.join(parts))
         self.lines += 1
 
-    def tag(self, name: str, attrMap: AttrT = None) -> TagCtxMgr:
-        return TagCtxMgr(self, name, attrMap)
+    def tag(self, name: str, attrMap: AttrT = None) -> HtmlWriter:
+        # the writer doubles as its own context manager so that nested
+        # with-blocks don't allocate a TagCtxMgr per tag
+        self.pendingTag = (name, attrMap)
+        return self
+
+    def __enter__(self) -> Self:
+        assert self.pendingTag is not None
+        name, attrMap = self.pendingTag
+        self.pendingTag = None
+        self.tagStack.append(name)
+        self.openTag(name, attrMap)
+        return self
+
+    def __exit__(self, exc_type: object = None, exc_value: object = None, traceback: object = None) -> None:
+        self.closeTag(self.tagStack.pop())
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Optional
+from typing import Any, Optional
 from code2dtree.types import Real, strToReal
 
 INFTY_STR = '∞'
@@ -7,12 +7,19 @@ NINFTY_STR = '-∞'
 
 
 class Interval:
+    __slots__ = ('beg', 'end', 'begClosed', 'endClosed', '_empty', '_hash')
+
+    FULL: 'Interval'
+    EMPTY: 'Interval'
+
     def __init__(self, beg: Optional[Real], end: Optional[Real], begClosed: bool, endClosed: bool):
         # None means -infty or +infty
         self.beg = beg
         self.end = end
         self.begClosed = begClosed
         self.endClosed = endClosed
+        self._empty: Optional[bool] = None
+        self._hash: Optional[int] = None
 
     @classmethod
     def fromStr(cls, s: str) -> Interval:
@@ -36,13 +43,41 @@ class Interval:
         return self.__class__.__name__ + str(self)
 
     def contains(self, x: Real) -> bool:
-        leftIn = self.beg is None or x > self.beg or (x >= self.beg and self.begClosed)
-        rightIn = self.end is None or x < self.end or (x <= self.end and self.endClosed)
-        return leftIn and rightIn
+        beg = self.beg
+        if beg is not None:
+            if x < beg:
+                return False
+            if x == beg and not self.begClosed:
+                return False
+        end = self.end
+        if end is not None:
+            if x > end:
+                return False
+            if x == end and not self.endClosed:
+                return False
+        return True
+
+    __contains__ = contains
+
+    def containsBatch(self, x: Any) -> Any:
+        # x is a numpy array of points; returns a boolean mask.
+        # vectorized counterpart of contains, for batch checks.
+        import numpy as np
+        mask = np.ones(x.shape, dtype=bool)
+        if self.beg is not None:
+            np.logical_and(mask, x >= self.beg if self.begClosed else x > self.beg, out=mask)
+        if self.end is not None:
+            np.logical_and(mask, x <= self.end if self.endClosed else x < self.end, out=mask)
+        return mask
 
     def isEmpty(self) -> bool:
-        return self.beg is not None and self.end is not None and (
-            self.beg > self.end or (self.beg >= self.end and not (self.begClosed and self.endClosed)))
+        # cached: isDisjoint and constraint propagation ask repeatedly
+        b = self._empty
+        if b is None:
+            b = self.beg is not None and self.end is not None and (
+                self.beg > self.end or (self.beg >= self.end and not (self.begClosed and self.endClosed)))
+            self._empty = b
+        return b
 
     def equals(self, other: Interval) -> bool:
         return (self.beg == other.beg and self.begClosed is other.begClosed
@@ -55,9 +90,17 @@ class Interval:
             return NotImplemented
 
     def __hash__(self) -> int:
-        return hash((self.beg, self.end, self.begClosed, self.endClosed))
+        h = self._hash
+        if h is None:
+            h = hash((self.beg, self.end, self.begClosed, self.endClosed))
+            self._hash = h
+        return h
 
     def intersect(self, other: Interval) -> Interval:
+        if self is Interval.FULL:
+            return other
+        if other is Interval.FULL:
+            return self
         beg: Optional[Real]
         begClosed: bool
         if self.beg is None:
@@ -92,7 +135,25 @@ class Interval:
         return self.intersect(other)
 
     def containsSet(self, other: Interval) -> bool:
-        return self.intersect(other).equals(other)
+        # endpoint comparisons directly, instead of allocating
+        # self.intersect(other) and checking it equals other
+        beg, obeg = self.beg, other.beg
+        if beg is not None:
+            if obeg is None or obeg < beg:
+                return False
+            if obeg == beg and other.begClosed and not self.begClosed:
+                return False
+        end, oend = self.end, other.end
+        if end is not None:
+            if oend is None or oend > end:
+                return False
+            if oend == end and other.endClosed and not self.endClosed:
+                return False
+        return True
 
     def isDisjoint(self, other: Interval) -> bool:
         return self.intersect(other).isEmpty()
+
+
+Interval.FULL = Interval(None, None, True, True)
+Interval.EMPTY = Interval(0, 0, False, False)
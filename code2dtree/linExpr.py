@@ -1,7 +1,10 @@
 from __future__ import annotations
+import functools
+import operator
+import weakref
 from enum import StrEnum
-from collections.abc import Collection, Iterable, Mapping, Sequence, Set
-from typing import Optional, TextIO, TypeVar
+from collections.abc import Collection, Iterable, Mapping, MutableMapping, Sequence, Set
+from typing import Callable, NamedTuple, Optional, TextIO, TypeVar
 
 from .expr import Var, Expr, BinExpr, UnExpr
 from .aggExpr import AggExpr
@@ -31,57 +34,148 @@ NEG_OP = {  # x op y iff not(x NEG_OP[op] y)
 }
 
 
+AffineStack = list[tuple[object, Real]]
+
+
+def affineAddHandler(e: BinExpr, m: Real, stack: AffineStack) -> None:
+    # rarg below larg so larg pops first, preserving the left-to-right
+    # insertion order of coeffDict
+    stack.append((e.rarg, m))
+    stack.append((e.larg, m))
+
+
+def affineSubHandler(e: BinExpr, m: Real, stack: AffineStack) -> None:
+    stack.append((e.rarg, -m))
+    stack.append((e.larg, m))
+
+
+def affineMulHandler(e: BinExpr, m: Real, stack: AffineStack) -> None:
+    isLExpr = isinstance(e.larg, Expr)
+    isRExpr = isinstance(e.rarg, Expr)
+    if isLExpr and isRExpr:
+        raise ValueError('parseAffineHelper: encountered product of expressions')
+    elif isLExpr:
+        stack.append((e.larg, m * validateRealness(e.rarg)))
+    elif isRExpr:
+        stack.append((e.rarg, m * validateRealness(e.larg)))
+    else:
+        raise ValueError('parseAffineHelper: encountered product of non-expressions')
+
+
+# op to stack-push handler: one hash lookup per node instead of a
+# string-compare ladder
+AFFINE_BIN_HANDLERS: dict[str, Callable[[BinExpr, Real, AffineStack], None]] = {
+    '+': affineAddHandler,
+    '-': affineSubHandler,
+    '*': affineMulHandler,
+}
+
+AFFINE_UN_SIGN = {'+': 1, '-': -1}
+
+
+def varAffineNode(e: Var, m: Real, stack: AffineStack, coeffDict: dict[object, Real]) -> None:
+    name = e.name
+    coeffDict[name] = coeffDict.get(name, 0) + m
+
+
+def unAffineNode(e: UnExpr, m: Real, stack: AffineStack, coeffDict: dict[object, Real]) -> None:
+    sign = AFFINE_UN_SIGN.get(e.op)
+    if sign is None:
+        raise ValueError('parseAffineHelper: unsupported operator ' + e.op)
+    stack.append((e.arg, sign * m))
+
+
+def binAffineNode(e: BinExpr, m: Real, stack: AffineStack, coeffDict: dict[object, Real]) -> None:
+    handler = AFFINE_BIN_HANDLERS.get(e.op)
+    if handler is None:
+        raise ValueError('parseAffineHelper: unsupported operator ' + e.op)
+    handler(e, m, stack)
+
+
+def aggAffineNode(e: AggExpr, m: Real, stack: AffineStack, coeffDict: dict[object, Real]) -> None:
+    if e.op == '+':
+        for arg in reversed(e.args):
+            stack.append((arg, m))
+    else:
+        raise ValueError('parseAffineHelper: unsupported AggExpr operator ' + e.op)
+
+
+# exact node type to handler: one lookup instead of an isinstance cascade;
+# subclasses miss and take the isinstance fallback below
+AFFINE_NODE_DISPATCH: dict[type[object], Callable[..., None]] = {
+    Var: varAffineNode,
+    UnExpr: unAffineNode,
+    BinExpr: binAffineNode,
+    AggExpr: aggAffineNode,
+}
+
+
 def parseAffineHelper(expr: object, coeffMul: Real, coeffDict: dict[object, Real]) -> Real:
-    if isinstance(expr, Var):
-        try:
-            coeffDict[expr.name] += coeffMul
-        except KeyError:
-            coeffDict[expr.name] = coeffMul
-        return 0
-    elif isinstance(expr, UnExpr):
-        if expr.op == '+':
-            return parseAffineHelper(expr.arg, coeffMul, coeffDict)
-        elif expr.op == '-':
-            return parseAffineHelper(expr.arg, -coeffMul, coeffDict)
-        else:
-            raise ValueError('parseAffineHelper: unsupported operator ' + expr.op)
-    elif isinstance(expr, BinExpr):
-        if expr.op == '+':
-            return (parseAffineHelper(expr.larg, coeffMul, coeffDict)
-                + parseAffineHelper(expr.rarg, coeffMul, coeffDict))
-        elif expr.op == '-':
-            return (parseAffineHelper(expr.larg, coeffMul, coeffDict)
-                + parseAffineHelper(expr.rarg, -coeffMul, coeffDict))
-        elif expr.op == '*':
-            isLExpr = isinstance(expr.larg, Expr)
-            isRExpr = isinstance(expr.rarg, Expr)
-            if isLExpr and isRExpr:
-                raise ValueError('parseAffineHelper: encountered product of expressions')
-            elif isLExpr:
-                return parseAffineHelper(expr.larg, coeffMul * validateRealness(expr.rarg), coeffDict)
-            elif isRExpr:
-                return parseAffineHelper(expr.rarg, coeffMul * validateRealness(expr.larg), coeffDict)
-            else:
-                raise ValueError('parseAffineHelper: encountered product of non-expressions')
+    # iterative: deep +/- chains would otherwise pay a Python frame per
+    # node and can hit the recursion limit
+    const: Real = 0
+    stack: AffineStack = [(expr, coeffMul)]
+    dispatch = AFFINE_NODE_DISPATCH
+    while stack:
+        e, m = stack.pop()
+        handler = dispatch.get(e.__class__)
+        if handler is not None:
+            handler(e, m, stack, coeffDict)
+        elif isinstance(e, Var):
+            varAffineNode(e, m, stack, coeffDict)
+        elif isinstance(e, UnExpr):
+            unAffineNode(e, m, stack, coeffDict)
+        elif isinstance(e, BinExpr):
+            binAffineNode(e, m, stack, coeffDict)
+        elif isinstance(e, AggExpr):
+            aggAffineNode(e, m, stack, coeffDict)
+        elif isinstance(e, Expr):
+            raise ValueError('parseAffineHelper: unknown Expr type ' + type(e).__name__)
         else:
-            raise ValueError('parseAffineHelper: unsupported operator ' + expr.op)
-    elif isinstance(expr, AggExpr):
-        if expr.op == '+':
-            return sum([parseAffineHelper(arg, coeffMul, coeffDict) for arg in expr.args])
-        else:
-            raise ValueError('parseAffineHelper: unsupported AggExpr operator ' + expr.op)
-    elif isinstance(expr, Expr):
-        raise ValueError('parseAffineHelper: unknown Expr type ' + type(expr).__name__)
-    else:
-        return validateRealness(expr) * coeffMul
+            const += validateRealness(e) * m
+    return const
 
 
 def parseAffine(expr: object) -> tuple[Mapping[object, Real], Real]:
     coeffDict: dict[object, Real] = {}
-    b = parseAffineHelper(expr, 1, coeffDict)
+    b = compileAffine(expr)(coeffDict)
     return (coeffDict, b)
 
 
+# keyed by the structural key of expr, so retraces of the same source
+# program reuse the residual (coeffs, const) instead of re-walking the AST
+affineCompileCache: dict[object, Callable[[dict[object, Real]], Real]] = {}
+
+
+def compileAffine(expr: object) -> Callable[[dict[object, Real]], Real]:
+    # partial evaluation: for a fixed AST shape the parse residue is just
+    # a list of coefficient increments and a constant, so the "compiled"
+    # parser is a closure over those
+    cacheKey = expr.key() if isinstance(expr, Expr) else (type(expr), expr)
+    try:
+        f = affineCompileCache.get(cacheKey)
+    except TypeError:  # unhashable key part
+        cacheKey = None
+        f = None
+    if f is None:
+        coeffDict: dict[object, Real] = {}
+        const = parseAffineHelper(expr, 1, coeffDict)
+        items = tuple(coeffDict.items())
+
+        def f(d: dict[object, Real], items: tuple[tuple[object, Real], ...] = items,
+                const: Real = const) -> Real:
+            for k, v in items:
+                d[k] = d.get(k, 0) + v
+            return const
+        if cacheKey is not None:
+            affineCompileCache[cacheKey] = f
+    return f
+
+
+def coeffItemRepr(kv: tuple[object, Real]) -> str:
+    return repr(kv[0])
+
+
 def argReprMin(a: Iterable[T]) -> Optional[T]:
     minX = None
     minY: Optional[str] = None
@@ -93,50 +187,64 @@ def argReprMin(a: Iterable[T]) -> Optional[T]:
 
 
 def canonicalizeDict(d: Mapping[object, Real]) -> tuple[Mapping[object, Real], bool]:
-    minKey = argReprMin(d.keys())
-    if minKey is None:  # d is empty
+    # the sign criterion must not depend on insertion order, so that the
+    # same constraint built as x-y and -(y-x) canonicalizes identically;
+    # min over the keys themselves is a C-level scan with no repr calls
+    if not d:
+        return (d, False)
+    try:
+        minKey: Optional[object] = min(d.keys())  # type: ignore[type-var]
+    except TypeError:  # keys not mutually comparable
+        minKey = argReprMin(d.keys())
+    assert minKey is not None
+    if d[minKey] >= 0:
         return (d, False)
     else:
-        if d[minKey] >= 0:
-            return (d, False)
-        else:
-            return ({k: -v for k, v in d.items()}, True)
+        return ({k: -v for k, v in d.items()}, True)
 
 
 def displayLinExprHelper(coeffs: Iterable[tuple[object, Real]], lineParts: list[str]) -> None:
+    # one f-string per term (callers join with spaces), instead of up to
+    # four appends per term
     isFirst = True
     for varName, coeff in coeffs:
         if coeff == 0:
             continue
         elif coeff < 0:
-            lineParts.append('-')
-            coeff = -coeff
-        elif not isFirst:
-            lineParts.append('+')
+            sign, coeff = '- ', -coeff
+        elif isFirst:
+            sign = ''
+        else:
+            sign = '+ '
         if coeff != 1:
-            lineParts.append(str(coeff))
-            lineParts.append('*')
-        lineParts.append(str(varName))
+            lineParts.append(f'{sign}{coeff} * {varName}')
+        else:
+            lineParts.append(f'{sign}{varName}')
         isFirst = False
     if isFirst:
         lineParts.append('0')
 
 
 class LinCmpExpr(Expr):
+    __slots__ = ('coeffMap', 'coeffItems', 'op', 'rhs', '_key')
+
     def __init__(self, coeffMap: Mapping[object, Real], op: str, rhs: Real):
+        super().__init__()
         self.coeffMap = coeffMap
-        self.frozenCoeffMap: Optional[ORSet] = None
+        # a sorted tuple of pairs instead of a frozenset: one hash structure
+        # per constraint, with C-level tuple equality and hashing; eager
+        # because the explorer keys constraint dicts by it on every decideIf
+        self.coeffItems: tuple[tuple[object, Real], ...] = tuple(
+            sorted(coeffMap.items(), key=coeffItemRepr))
         self.op = op
         self.rhs = rhs
+        self._key = (self.__class__.__name__, self.coeffItems, op, rhs)
 
     def __repr__(self) -> str:
-        return '{}({}, {}, {})'.format(self.__class__.__name__, repr(self.coeffMap),
-            repr(self.op), repr(self.rhs))
+        return f'{self.__class__.__name__}({self.coeffMap!r}, {self.op!r}, {self.rhs!r})'
 
     def key(self) -> object:
-        if self.frozenCoeffMap is None:
-            self.frozenCoeffMap = frozenset(self.coeffMap.items())
-        return (self.__class__.__name__, self.frozenCoeffMap, self.op, self.rhs)
+        return self._key
 
     def __str__(self) -> str:
         lineParts: list[str] = []
@@ -172,7 +280,7 @@ def convertOp(op: str, ineqMode: IneqMode) -> str:
         return CONVERT_OP[(op, ineqMode)]
 
 
-def parseLinCmpExpr(expr: Expr, ineqMode: IneqMode) -> LinCmpExpr:
+def parseLinCmpExprHelper(expr: Expr, ineqMode: IneqMode) -> LinCmpExpr:
     if isinstance(expr, LinCmpExpr):
         newOp = convertOp(expr.op, ineqMode)
         if newOp == expr.op:
@@ -180,6 +288,14 @@ def parseLinCmpExpr(expr: Expr, ineqMode: IneqMode) -> LinCmpExpr:
         else:
             return LinCmpExpr(expr.coeffMap, newOp, expr.rhs)
     elif isinstance(expr, BinExpr) and expr.op in FLIP_OP.keys():
+        larg, rarg = expr.larg, expr.rarg
+        # fast path: most traced predicates compare one variable against a
+        # constant, which needs no affine walk or canonicalization
+        if isinstance(larg, Var) and not isinstance(rarg, Expr):
+            return LinCmpExpr({larg.name: 1}, convertOp(expr.op, ineqMode), validateRealness(rarg))
+        elif isinstance(rarg, Var) and not isinstance(larg, Expr):
+            return LinCmpExpr({rarg.name: 1}, convertOp(FLIP_OP[expr.op], ineqMode),
+                validateRealness(larg))
         coeffDict: dict[object, Real] = {}
         rhs = - (parseAffineHelper(expr.larg, 1, coeffDict)
             + parseAffineHelper(expr.rarg, -1, coeffDict))
@@ -196,43 +312,91 @@ def parseLinCmpExpr(expr: Expr, ineqMode: IneqMode) -> LinCmpExpr:
         raise ValueError('expected BinExpr with comparison operator')
 
 
+# keyed by (id(expr), ineqMode); the stored weakref both keeps the entry
+# honest under id reuse and evicts it when the expr dies
+linParseCache: dict[tuple[int, IneqMode], tuple[weakref.ref[Expr], LinCmpExpr]] = {}
+
+
+def parseLinCmpExpr(expr: Expr, ineqMode: IneqMode) -> LinCmpExpr:
+    # the result is a pure function of expr, and the same expr object is
+    # parsed once per run of the traced function, so memoize by identity
+    cacheKey = (id(expr), ineqMode)
+    entry = linParseCache.get(cacheKey)
+    if entry is not None and entry[0]() is expr:
+        return entry[1]
+    result = parseLinCmpExprHelper(expr, ineqMode)
+    if result is expr:
+        # caching a self-parse would store a strong reference to the very
+        # object the weakref watches, making the entry immortal; the
+        # LinCmpExpr passthrough is cheap enough to redo
+        return result
+
+    def evict(r: weakref.ref[Expr], k: tuple[int, IneqMode] = cacheKey) -> None:
+        linParseCache.pop(k, None)
+    linParseCache[cacheKey] = (weakref.ref(expr, evict), result)
+    return result
+
+
+@functools.lru_cache(maxsize=8192)
 def opToInterval(op: str, v: Real) -> Interval:
+    # intervals are immutable, and the same (op, v) half-planes recur on
+    # every retrace, so share one instance per pair
     if op in ('<', '≤'):
         return Interval(None, v, False, op == '≤')
     else:
         return Interval(v, None, op == '≥', False)
 
 
+@functools.lru_cache(maxsize=8192)
+def opToIntervalPair(op: str, negOp: str, ineqMode: IneqMode, v: Real) -> tuple[Interval, Interval]:
+    # (falseInt, trueInt) for decideIf in one cached call
+    return (opToInterval(convertOp(negOp, ineqMode), v), opToInterval(op, v))
+
+
+CMP_OP_FUNCS: dict[str, Callable[[Real, Real], bool]] = {
+    '<': operator.lt,
+    '>': operator.gt,
+    '≥': operator.ge,
+    '≤': operator.le,
+    '==': operator.eq,
+}
+
+
 def evalOp(larg: Real, op: str, rarg: Real) -> bool:
-    if op == '<':
-        return larg < rarg
-    elif op == '>':
-        return larg > rarg
-    elif op == '≥':
-        return larg >= rarg
-    elif op == '≤':
-        return larg <= rarg
-    elif op == '==':
-        return larg == rarg
-    else:
+    f = CMP_OP_FUNCS.get(op)
+    if f is None:
         raise ValueError('invalid operator ' + op)
+    return f(larg, rarg)
 
 
-def addConstrToDict(expr: Expr | bool, b: bool, d: ConstrDict, ineqMode: IneqMode) -> None:
-    if isinstance(expr, bool):
-        if expr != b:
-            raise Exception("Entering impossible scenario.")
-        return
-    linExpr = parseLinCmpExpr(expr, ineqMode)
+class OpInfo(NamedTuple):
+    func: Callable[[Real, Real], bool]
+    negOp: Optional[str]  # None for ==, which has no single-op negation
+
+
+# everything a constraint decision needs about an op, in one dict lookup
+OP_INFO: dict[str, OpInfo] = {
+    '<': OpInfo(operator.lt, NEG_OP['<']),
+    '>': OpInfo(operator.gt, NEG_OP['>']),
+    '≤': OpInfo(operator.le, NEG_OP['≤']),
+    '≥': OpInfo(operator.ge, NEG_OP['≥']),
+    '==': OpInfo(operator.eq, None),
+}
+
+
+def addParsedConstrToDict(linExpr: LinCmpExpr, b: bool, d: MutableMapping[ORColl, Interval],
+        ineqMode: IneqMode) -> None:
     coeffDict, op, rhs = linExpr.coeffMap, linExpr.op, linExpr.rhs
+    info = OP_INFO[op]
     if not coeffDict:
-        exprValue = evalOp(0, op, rhs)
-        if exprValue != b:
+        if info.func(0, rhs) != b:
             raise Exception("Entering impossible scenario.")
         return
     if not b:
-        op = convertOp(NEG_OP[op], ineqMode)
-    coeffs = frozenset(coeffDict.items())
+        if info.negOp is None:
+            raise KeyError(op)
+        op = convertOp(info.negOp, ineqMode)
+    coeffs: ORColl = linExpr.coeffItems
     oldInt = d.get(coeffs)
     newInt = opToInterval(op, rhs)
     if oldInt is None:
@@ -245,6 +409,15 @@ def addConstrToDict(expr: Expr | bool, b: bool, d: ConstrDict, ineqMode: IneqMod
             d[coeffs] = intersectInt
 
 
+def addConstrToDict(expr: Expr | bool, b: bool, d: MutableMapping[ORColl, Interval],
+        ineqMode: IneqMode) -> None:
+    if isinstance(expr, bool):
+        if expr != b:
+            raise Exception("Entering impossible scenario.")
+        return
+    addParsedConstrToDict(parseLinCmpExpr(expr, ineqMode), b, d, ineqMode)
+
+
 def displayConstraints(d: ConstrMap, fp: TextIO) -> None:
     for coeffs, interval in d.items():
         lineParts: list[str] = []
@@ -262,42 +435,65 @@ class LinConstrTreeExplorer(TreeExplorer):
         self.ineqMode = ineqMode
         for expr in baseConstraintsList:
             addConstrToDict(expr, True, self.baseConstraintsDict, ineqMode)
+        # constraint writes are logged to a trail, so finishing a path
+        # unwinds O(writes) instead of copying the base dict; plain dict
+        # reads stay on the C fast path
         self.constraints: ConstrDict = dict(self.baseConstraintsDict)
+        self.trail: list[tuple[ORColl, Optional[Interval]]] = []
         self.storeLeafConstr = storeLeafConstr
 
     def noteIf(self, expr: Expr, b: bool) -> None:
-        addConstrToDict(expr, b, self.constraints, self.ineqMode)
+        # parseLinCmpExpr is identity-memoized, so when decideIf already
+        # parsed this expr the parse here is a dict hit
+        linExpr = parseLinCmpExpr(expr, self.ineqMode)
+        coeffs: ORColl = linExpr.coeffItems
+        self.trail.append((coeffs, self.constraints.get(coeffs)))
+        addParsedConstrToDict(linExpr, b, self.constraints, self.ineqMode)
 
     def decideIf(self, expr: Expr) -> tuple[bool, bool, Optional[Expr]]:
         linExpr = parseLinCmpExpr(expr, self.ineqMode)
         coeffDict, op, rhs = linExpr.coeffMap, linExpr.op, linExpr.rhs
+        info = OP_INFO[op]
         if not coeffDict:
-            exprValue = evalOp(0, op, rhs)
-            return (exprValue, False, linExpr)
-        coeffs = frozenset(coeffDict.items())
+            return (info.func(0, rhs), False, linExpr)
+        coeffs: ORColl = linExpr.coeffItems
         oldInt = self.constraints.get(coeffs)
-        falseInt = opToInterval(convertOp(NEG_OP[op], self.ineqMode), rhs)
-        trueInt = opToInterval(op, rhs)
+        if info.negOp is None:
+            raise KeyError(op)
+        falseInt, trueInt = opToIntervalPair(op, info.negOp, self.ineqMode, rhs)
         if oldInt is None:
+            self.trail.append((coeffs, None))
             self.constraints[coeffs] = falseInt
             return (False, True, linExpr)
         else:
             assert not oldInt.isEmpty()
-            falseInt2, trueInt2 = oldInt.intersect(falseInt), oldInt.intersect(trueInt)
+            self.trail.append((coeffs, oldInt))
+            falseInt2 = oldInt.intersect(falseInt)
             if falseInt2.isEmpty():
-                self.constraints[coeffs] = trueInt2
+                self.constraints[coeffs] = oldInt.intersect(trueInt)
                 return (True, False, linExpr)
-            else:
-                self.constraints[coeffs] = falseInt2
-                return (False, not trueInt2.isEmpty(), linExpr)
+            self.constraints[coeffs] = falseInt2
+            if self.ineqMode == IneqMode.exact:
+                # in exact mode falseInt and trueInt partition the line, so
+                # the true side is feasible iff the false side did not
+                # absorb all of oldInt; skips the second intersection
+                return (False, not falseInt2.equals(oldInt), linExpr)
+            return (False, not oldInt.intersect(trueInt).isEmpty(), linExpr)
 
     def noteReturn(self, expr: object) -> Optional[ConstrMap]:
         constraints = self.constraints
-        self.constraints = dict(self.baseConstraintsDict)
         if self.storeLeafConstr:
-            return constraints
+            result: Optional[ConstrMap] = dict(constraints)
         else:
-            return None
+            result = None
+        # unwind newest-first so multiply-written keys restore correctly
+        for coeffs, oldInt in reversed(self.trail):
+            if oldInt is None:
+                constraints.pop(coeffs, None)
+            else:
+                constraints[coeffs] = oldInt
+        self.trail.clear()
+        return result
 
     def displayConstraints(self, fp: TextIO) -> None:
         displayConstraints(self.constraints, fp)
@@ -1,13 +1,16 @@
 from __future__ import annotations
 import sys
 import dataclasses
-from collections.abc import Iterable, MutableSequence, Sequence
-from typing import Any, Optional
+from collections.abc import Iterable, Mapping, MutableSequence, Sequence
+from typing import Any, Optional, TYPE_CHECKING
 
-from .expr import Expr, prettyExprRepr
+from .expr import Expr, evalExpr, prettyExprRepr
 from .terminal import TermColorOptions
 from .types import JsonVal
 
+if TYPE_CHECKING:
+    from .rrtg import RepeatedRunTreeGen
+
 
 @dataclasses.dataclass
 class PrintAttr:
@@ -17,6 +20,8 @@ class PrintAttr:
 
 
 class Node:
+    __slots__ = ('expr', 'parent', 'explored', 'printAttr', 'userData')
+
     noneString = '(unfinished)'
     passString = 'pass'
 
@@ -28,7 +33,7 @@ class Node:
         self.userData: dict[Any, Any] = {}
 
     def __repr__(self) -> str:
-        return '{}({}, exp={})'.format(self.__class__.__name__, self.expr, self.explored)
+        return f'{self.__class__.__name__}({self.expr}, exp={self.explored})'
 
     def getKids(self) -> Sequence[Optional[Node]]:
         raise NotImplementedError()
@@ -63,6 +68,8 @@ class Node:
 
 
 class LeafNode(Node):
+    __slots__ = ('explorerOutput',)
+
     def __init__(self, expr: object, parent: Optional[InternalNode]):
         super().__init__(expr, parent, True)
         self.explorerOutput: object = None
@@ -75,6 +82,8 @@ class LeafNode(Node):
 
 
 class ReturnNode(LeafNode):
+    __slots__ = ()
+
     def __init__(self, expr: object, parent: Optional[InternalNode]):
         super().__init__(expr, parent)
 
@@ -83,9 +92,22 @@ class ReturnNode(LeafNode):
 
 
 class InternalNode(Node):
+    __slots__ = ('_kids', 'unexplored')
+
     def __init__(self, expr: object, parent: Optional[InternalNode], nKids: int):
         super().__init__(expr, parent, False)
-        self.kids: MutableSequence[Optional[Node]] = [None] * nKids
+        self.unexplored = nKids
+        self.initKids(nKids)
+
+    def initKids(self, nKids: int) -> None:
+        self._kids: MutableSequence[Optional[Node]] = [None] * nKids
+
+    @property
+    def kids(self) -> Sequence[Optional[Node]]:
+        return self._kids
+
+    def setKid(self, i: int, node: Optional[Node]) -> None:
+        self._kids[i] = node
 
     def getKids(self) -> Sequence[Optional[Node]]:
         return self.kids
@@ -105,16 +127,20 @@ class InternalNode(Node):
         return (nEKids, nKids)
 
     def setExploreStatusRec(self) -> None:
-        nEKids, nKids = self.getKidsExploreStatus()
-        if nEKids == nKids:
-            self.explored = True
-            if self.parent is not None:
-                self.parent.setExploreStatusRec()
+        # called when one of self's kids has just become explored; the counter
+        # replaces rescanning kids on every leaf with one decrement per level
+        node: Optional[InternalNode] = self
+        while node is not None:
+            node.unexplored -= 1
+            if node.unexplored:
+                break
+            node.explored = True
+            node = node.parent
 
     def __repr__(self) -> str:
-        parts = ['{}({}'.format(self.__class__.__name__, self.expr)]
+        parts = [f'{self.__class__.__name__}({self.expr}']
         for i, kid in enumerate(self.kids):
-            parts.append('{}={}'.format(i, kid))
+            parts.append(f'{i}={kid}')
         return ', '.join(parts) + ')'
 
     def toIsolatedJson(self) -> dict[str, JsonVal]:
@@ -124,6 +150,8 @@ class InternalNode(Node):
 
 
 class DecisionNode(InternalNode):
+    __slots__ = ('sexpr',)
+
     def __init__(self, expr: Expr, parent: Optional[InternalNode], nKids: int):
         super().__init__(expr, parent, nKids)
         self.sexpr: Optional[Expr] = None  # simplified expr
@@ -133,21 +161,70 @@ class DecisionNode(InternalNode):
         d['sexpr'] = prettyExprRepr(self.sexpr)
         return d
 
+    def replay(self, gen: RepeatedRunTreeGen, expr: Expr) -> Optional[bool]:
+        # re-run path: pick the branch to take at this node and move gen down,
+        # or return None to let the explorer decide
+        raise NotImplementedError()
+
 
 class IfNode(DecisionNode):
+    # the two kids are stored as plain attributes to avoid a list per node
+    __slots__ = ('kid0', 'kid1')
+
     def __init__(self, expr: Expr, parent: Optional[InternalNode]):
         super().__init__(expr, parent, 2)
 
+    def initKids(self, nKids: int) -> None:
+        self.kid0: Optional[Node] = None
+        self.kid1: Optional[Node] = None
+
+    @property
+    def kids(self) -> Sequence[Optional[Node]]:
+        return (self.kid0, self.kid1)
+
+    def setKid(self, i: int, node: Optional[Node]) -> None:
+        if i:
+            self.kid1 = node
+        else:
+            self.kid0 = node
+
     def getLabel(self, simplify: bool = False) -> str:
         expr = self.sexpr if simplify else self.expr
         return 'if ' + prettyExprRepr(expr)
 
+    def replay(self, gen: RepeatedRunTreeGen, expr: Expr) -> Optional[bool]:
+        # read the kid slots directly: this runs at every fork of every
+        # replay, so avoid building the kids tuple
+        kid1 = self.kid1
+        if kid1 is not None and kid1.explored:
+            b = False
+        else:
+            kid0 = self.kid0
+            if kid0 is None or not kid0.explored:
+                return None
+            b = True
+        gen.explorer.noteIf(expr, b)
+        gen.goDown(b)
+        return b
+
 
 class FrozenIfNode(DecisionNode):
+    __slots__ = ('b', 'kid0')
+
     def __init__(self, expr: Expr, parent: Optional[InternalNode], b: bool):
         super().__init__(expr, parent, 1)
         self.b = b
 
+    def initKids(self, nKids: int) -> None:
+        self.kid0: Optional[Node] = None
+
+    @property
+    def kids(self) -> Sequence[Optional[Node]]:
+        return (self.kid0,)
+
+    def setKid(self, i: int, node: Optional[Node]) -> None:
+        self.kid0 = node
+
     def toIsolatedJson(self) -> dict[str, JsonVal]:
         d = super().toIsolatedJson()
         d['b'] = self.b
@@ -158,12 +235,30 @@ class FrozenIfNode(DecisionNode):
         return (('assert ' if self.kids[0] is not None else 'asserting ')
             + ('' if self.b else 'not(') + prettyExprRepr(expr) + ('' if self.b else ')'))
 
+    def replay(self, gen: RepeatedRunTreeGen, expr: Expr) -> Optional[bool]:
+        b = self.b
+        gen.explorer.noteIf(expr, b)
+        gen.goDown(0)
+        return b
+
 
 class InfoNode(InternalNode):
+    __slots__ = ('verb', 'kid0')
+
     def __init__(self, value: object, parent: Optional[InternalNode], verb: str):
         super().__init__(value, parent, 1)
         self.verb = verb
 
+    def initKids(self, nKids: int) -> None:
+        self.kid0: Optional[Node] = None
+
+    @property
+    def kids(self) -> Sequence[Optional[Node]]:
+        return (self.kid0,)
+
+    def setKid(self, i: int, node: Optional[Node]) -> None:
+        self.kid0 = node
+
     def toIsolatedJson(self) -> dict[str, JsonVal]:
         d = super().toIsolatedJson()
         d['verb'] = self.verb
@@ -183,6 +278,8 @@ class InfoNode(InternalNode):
 
 
 class CheckpointNode(InfoNode):
+    __slots__ = ()
+
     defaultVerb = 'print:'
 
     def __init__(self, value: object, parent: Optional[InternalNode]):
@@ -190,7 +287,26 @@ class CheckpointNode(InfoNode):
 
 
 class YieldNode(InfoNode):
+    __slots__ = ()
+
     defaultVerb = 'yield'
 
     def __init__(self, value: object, parent: Optional[InternalNode]):
         super().__init__(value, parent, YieldNode.defaultVerb)
+
+
+def evalTree(root: Node, varMap: Mapping[object, object]) -> object:
+    # follow one root-to-leaf path for a concrete assignment of variables;
+    # cheaper than re-running the traced function once the tree is built
+    node: Optional[Node] = root
+    while node is not None:
+        if isinstance(node, LeafNode):
+            return evalExpr(node.expr, varMap)
+        elif isinstance(node, IfNode):
+            assert isinstance(node.expr, Expr)
+            node = node.kid1 if node.expr.eval(varMap) else node.kid0
+        elif isinstance(node, FrozenIfNode) or isinstance(node, InfoNode):
+            node = node.kid0
+        else:
+            raise TypeError('node type {} not supported'.format(repr(type(node).__name__)))
+    raise ValueError('tree is unfinished along this path')
@@ -37,6 +37,21 @@ class PrintStatus:
     indent: int = 0
 
 
+_INDENT_CACHE: dict[str, list[str]] = {}
+
+
+def getIndent(indentStr: str, n: int) -> str:
+    # string multiplication allocates on every call; printing revisits the
+    # same few depths constantly, so memoize per indentStr
+    try:
+        cache = _INDENT_CACHE[indentStr]
+    except KeyError:
+        cache = _INDENT_CACHE[indentStr] = ['']
+    while len(cache) <= n:
+        cache.append(cache[-1] + indentStr)
+    return cache[n]
+
+
 def getPrefix(attr: PrintAttr, options: PrintOptions, status: PrintStatus) -> str:
     parts = []
     if options.lineNoCols:
@@ -45,7 +60,7 @@ def getPrefix(attr: PrintAttr, options: PrintOptions, status: PrintStatus) -> st
     if options.marginCols:
         parts.append(attr.margin.rjust(options.marginCols))
         parts.append('|')
-    parts.append(status.indent * options.indentStr)
+    parts.append(getIndent(options.indentStr, status.indent))
     return ''.join(parts)
 
 
@@ -126,42 +141,79 @@ def printTree(node: Node, options: PrintOptions = DEFAULT_PO, status: Optional[P
 GraphEdge = tuple[int, int, Optional[int]]
 
 
+def countNodes(root: Node) -> int:
+    n = 0
+    nodeStack = [root]
+    while nodeStack:
+        u = nodeStack.pop()
+        n += 1
+        for v in u.getKids():
+            if v is not None:
+                nodeStack.append(v)
+    return n
+
+
 def toVE(root: Node) -> tuple[list[Node], list[GraphEdge]]:
-    V = []
-    E: list[GraphEdge] = []
-    id = 0
-
-    def explore(u: Node, ui: int) -> None:
-        nonlocal id
-        V.append(u)
-        if isinstance(u, IfNode):
-            for j, v in enumerate(u.kids):
+    # preallocate V and E (every node except root has exactly one in-edge)
+    n = countNodes(root)
+    V: list[Node] = [root] * n
+    E: list[GraphEdge] = [(0, 0, None)] * (n - 1)
+    # explicit stack instead of recursion: no frame per node, no recursion limit
+    stack: list[tuple[Node, int, Optional[int]]] = [(root, -1, None)]
+    push = stack.append
+    pop = stack.pop
+    ui = 0
+    ei = 0
+    while stack:
+        u, pi, label = pop()
+        V[ui] = u
+        if pi >= 0:
+            E[ei] = (pi, ui, label)
+            ei += 1
+        # exact-type checks are pointer compares; IfNode and FrozenIfNode are
+        # never subclassed, while InfoNode needs isinstance for its subclasses
+        if type(u) is IfNode:
+            for j in (1, 0):
+                v = u.kids[j]
                 if v is not None:
-                    id += 1
-                    vi = id
-                    E.append((ui, vi, j))
-                    explore(v, vi)
-        elif isinstance(u, FrozenIfNode):
-            j, v = 0, u.kids[0]
-            if v is not None:
-                id += 1
-                vi = id
-                E.append((ui, vi, None))
-                explore(v, vi)
-        elif isinstance(u, InfoNode):
+                    push((v, ui, j))
+        elif type(u) is FrozenIfNode or isinstance(u, InfoNode):
             v = u.kids[0]
             if v is not None:
-                id += 1
-                vi = id
-                E.append((ui, vi, None))
-                explore(v, vi)
+                push((v, ui, None))
         elif isinstance(u, InternalNode):
             raise TypeError('node type {} not supported'.format(repr(type(u).__name__)))
-
-    explore(root, 0)
+        ui += 1
     return (V, E)
 
 
+class TreeArrays(NamedTuple):
+    # struct-of-arrays view of a tree: parallel lists indexed by node number;
+    # denser than the Node graph, so bulk scans and dumps avoid pointer chasing
+    kind: list[str]
+    expr: list[object]
+    parent: list[int]  # -1 for the root
+    kid0: list[int]  # -1 if absent
+    kid1: list[int]  # -1 if absent
+
+
+def treeToArrays(root: Node) -> TreeArrays:
+    V, E = toVE(root)
+    n = len(V)
+    kind = [type(u).__name__ for u in V]
+    expr = [u.expr for u in V]
+    parent = [-1] * n
+    kid0 = [-1] * n
+    kid1 = [-1] * n
+    for (u, v, label) in E:
+        parent[v] = u
+        if label == 1:
+            kid1[u] = v
+        else:
+            kid0[u] = v
+    return TreeArrays(kind, expr, parent, kid0, kid1)
+
+
 def dtreeToFlatJson(root: Node) -> dict[str, JsonVal]:
     nodeJsons: list[Optional[JsonVal]] = []
     parentOf: list[Optional[int]] = []
@@ -190,15 +242,16 @@ def dtreeToFlatJson(root: Node) -> dict[str, JsonVal]:
 
 def printGraphViz(root: Node, file: TextIO) -> None:
     V, E = toVE(root)
-    print('digraph DTree{', file=file)
+    lines = ['digraph DTree{']
     for i, w in enumerate(V):
-        print('v{} [label="{}"];'.format(i, w.getLabel()), file=file)
+        lines.append(f'v{i} [label="{w.getLabel()}"];')
     for (u, v, label) in E:
         if label is None:
-            print(f'v{u} -> v{v};', file=file)
+            lines.append(f'v{u} -> v{v};')
         else:
-            print(f'v{u} -> v{v} [label="{label}"];', file=file)
-    print('}', file=file)
+            lines.append(f'v{u} -> v{v} [label="{label}"];')
+    lines.append('}\n')
+    file.write('\n'.join(lines))
 
 
 SAVE_FORMATS = ('txt', 'dot', 'svg', 'json')
@@ -27,7 +27,7 @@ class RepeatedRunTreeGen:
         return self.root is not None and self.root.explored
 
     def __repr__(self) -> str:
-        return 'RRDTG(root={})'.format(repr(self.root))
+        return f'RRDTG(root={self.root!r})'
 
     def goDown(self, i: int) -> None:
         assert self.current is not None and isinstance(self.current, InternalNode)
@@ -39,7 +39,7 @@ class RepeatedRunTreeGen:
         assert self.current is None
         if self.parent is not None:
             assert self.kidIndex is not None
-            self.parent.kids[self.kidIndex] = node
+            self.parent.setKid(self.kidIndex, node)
         else:
             self.root = node
         self.parent = node
@@ -47,21 +47,12 @@ class RepeatedRunTreeGen:
         self.kidIndex = i
 
     def decideIf(self, expr: Expr) -> bool:
-        if self.current is not None:
-            assert isinstance(self.current, IfNode) or isinstance(self.current, FrozenIfNode)
-            kidStatuses = [kid is not None and kid.explored for kid in self.current.kids]
-            assert sum(kidStatuses) < len(kidStatuses)
-            if isinstance(self.current, IfNode):
-                for b in (False, True):
-                    if kidStatuses[not b]:
-                        self.explorer.noteIf(expr, b)
-                        self.goDown(b)
-                        return b
-            else:
-                b = self.current.b
-                self.explorer.noteIf(expr, b)
-                self.goDown(0)
-                return b
+        cur = self.current
+        if cur is not None:
+            assert isinstance(cur, DecisionNode) and not cur.explored
+            rb = cur.replay(self, expr)
+            if rb is not None:
+                return rb
 
         # now all kids are unexplored and self.current is not a FrozenIfNode
         b, checkOther, sexpr = self.explorer.decideIf(expr)
@@ -95,7 +86,7 @@ class RepeatedRunTreeGen:
         node = ReturnNode(expr, self.parent)
         if self.parent is not None:
             assert self.kidIndex is not None
-            self.parent.kids[self.kidIndex] = node
+            self.parent.setKid(self.kidIndex, node)
         else:
             self.root = node
 
@@ -114,10 +105,21 @@ class RepeatedRunTreeGen:
 
     def run(self, func: Callable[..., object], funcArgs: FuncArgs) -> None:
         Expr.globalTreeGen = self
-        while not self.finished():
-            result = func(*(funcArgs.args), **(funcArgs.kwargs))
-            self.reportEnd(result)
-        Expr.globalTreeGen = None
+        origBool = Expr.__bool__
+
+        def fastBool(expr: Expr, _decideIf: Callable[[Expr], bool] = self.decideIf) -> bool:
+            # decideIf is captured in a default arg, skipping Expr.__bool__'s
+            # class-attribute lookup and None check on every branch
+            return _decideIf(expr)
+
+        setattr(Expr, '__bool__', fastBool)
+        try:
+            while not self.finished():
+                result = func(*(funcArgs.args), **(funcArgs.kwargs))
+                self.reportEnd(result)
+        finally:
+            setattr(Expr, '__bool__', origBool)
+            Expr.globalTreeGen = None
 
     def iterateOnce(self, gen: Generator[object, None, object]) -> None:
         Expr.globalTreeGen = self
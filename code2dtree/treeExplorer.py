@@ -18,22 +18,28 @@ class TreeExplorer:
 
 
 class CachedTreeExplorer(TreeExplorer):
+    # exprs built via overloaded operators are interned, so within a run the
+    # same decision yields the same object and id() is a valid cache key;
+    # with interning off (Expr.hashCons = False) distinct objects can carry
+    # the same decision, so fall back to the structural key.
+    # Entries carry a generation number instead of being cleared after each
+    # trace: noteReturn bumps the generation, invalidating them in O(1).
     def __init__(self) -> None:
         super().__init__()
-        self.cache: dict[object, bool] = {}
+        self.cache: dict[object, tuple[int, bool]] = {}
+        self.cacheVer = 0
 
     def noteIf(self, expr: Expr, b: bool) -> None:
-        key = expr.key()
-        self.cache[key] = b
+        key = id(expr) if Expr.hashCons else expr.key()
+        self.cache[key] = (self.cacheVer, b)
 
     def decideIf(self, expr: Expr) -> tuple[bool, bool, Optional[Expr]]:
-        key = expr.key()
-        try:
-            b = self.cache[key]
-            return (b, False, None)
-        except KeyError:
-            self.cache[key] = False
-            return (False, True, None)
+        key = id(expr) if Expr.hashCons else expr.key()
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] == self.cacheVer:
+            return (entry[1], False, None)
+        self.cache[key] = (self.cacheVer, False)
+        return (False, True, None)
 
     def noteReturn(self, expr: object) -> None:
-        self.cache.clear()
+        self.cacheVer += 1
@@ -2,7 +2,9 @@
 
 import sys  # noqa
 import unittest
-from code2dtree.expr import Var, BinExpr
+from code2dtree.expr import Var, BinExpr, codegenExpr, compileExpr, evalExpr
+from code2dtree.node import evalTree
+from code2dtree.rrtg import func2dtree
 from code2dtree.interval import Interval
 from code2dtree.linExpr import parseLinCmpExpr, LinCmpExpr
 from code2dtree.linExpr import addConstrToDict, ConstrDict, LinConstrTreeExplorer, IneqMode
@@ -25,6 +27,33 @@ class ExprTest(unittest.TestCase):
         self.assertEqual(automatic.key(), manual.key())
 
 
+class EvalTest(unittest.TestCase):
+    def testExpr(self) -> None:
+        x, y = Var.get('evx'), Var.get('evy')
+        expr = (x + 2) * y - 3
+        self.assertEqual(evalExpr(expr, {'evx': 5, 'evy': 4}), 25)
+
+    def testCompiledExpr(self) -> None:
+        x, y = Var.get('evcx'), Var.get('evcy')
+        f = compileExpr((x + 2) * y - 3)
+        self.assertEqual(f({'evcx': 5, 'evcy': 4}), 25)
+        self.assertEqual(f({'evcx': 0, 'evcy': 1}), -1)
+
+    def testCodegenExpr(self) -> None:
+        x, y = Var.get('evgx'), Var.get('evgy')
+        f = codegenExpr((x + 2) * y - 3, ['evgx', 'evgy'])
+        self.assertEqual(f([5, 4]), 25)
+        self.assertEqual(f([0, 1]), -1)
+
+    def testTree(self) -> None:
+        def maxOf2(x: object, y: object) -> object:
+            return x if x > y else y  # type: ignore[operator]
+
+        dtree = func2dtree(maxOf2, [Var.get('evp'), Var.get('evq')])
+        self.assertEqual(evalTree(dtree, {'evp': 3, 'evq': 8}), 8)
+        self.assertEqual(evalTree(dtree, {'evp': 9, 'evq': 8}), 9)
+
+
 class IntervalTest(unittest.TestCase):
     def testContains1(self) -> None:
         interval = Interval.fromStr('[2, 3)')
@@ -50,6 +79,12 @@ class IntervalTest(unittest.TestCase):
         self.assertTrue(Interval.fromStr('(2, 2)').isEmpty())
         self.assertFalse(Interval.fromStr('(2, 3)').isEmpty())
 
+    def testContainsBatch(self) -> None:
+        import numpy as np
+        interval = Interval.fromStr('[2, 3)')
+        mask = interval.containsBatch(np.array([1, 2, 2.5, 3, 3.5]))
+        self.assertEqual(list(mask), [False, True, True, False, False])
+
     def testIntersect(self) -> None:
         self.assertEqual(Interval.fromStr('[2, 4)') & Interval.fromStr('(3, 5]'),
             Interval.fromStr('(3, 4)'))